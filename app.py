@@ -10,8 +10,11 @@ import os
 import json
 import tiktoken
 from dotenv import load_dotenv
-from typing import Optional # For the return type
+from typing import Optional, Iterable, Iterator, Callable # Type hints
 import re # For clean_user_text
+import codecs # Incremental UTF-8 decoding of uploaded files
+from contextlib import contextmanager
+from itertools import chain
 # import asyncio # Added
 # from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, CacheMode # Added
 import traceback
@@ -69,6 +72,7 @@ if 'selected_model_display_name' not in st.session_state:
 TOKEN_THRESHOLD = 3500  # Max tokens for direct summarization (conservative for Llama3 8B)
 CHUNK_TARGET_TOKENS = 3000 # Target for each chunk in MapReduce
 CHUNK_OVERLAP_TOKENS = 150   # Overlap for chunks
+UPLOAD_BLOCK_BYTES = 256 * 1024 # Bytes decoded per step when streaming an uploaded document
 
 # Initialize session state (ensure all are present)
 if 'generated_summary' not in st.session_state:
@@ -204,7 +208,7 @@ def clean_user_text(raw_text: str) -> str:
 
     return cleaned_text
 
-def get_summary_from_llama(text_to_summarize: str, summary_length_ui: str, output_format_ui: str, creativity_level: str, selected_model_id: Optional[str], is_intermediate_summary: bool = False) -> str:
+def get_summary_from_llama(text_to_summarize: str, summary_length_ui: str, output_format_ui: str, creativity_level: str, selected_model_id: Optional[str], is_intermediate_summary: bool = False, log_payload: bool = True) -> str:
     temperature_map = {"Низкий": 0.2, "Средний": 0.5, "Высокий": 0.8}
     temperature = temperature_map.get(creativity_level, 0.5)
 
@@ -239,10 +243,11 @@ def get_summary_from_llama(text_to_summarize: str, summary_length_ui: str, outpu
     headers = {"Authorization": f"Bearer {PROXY_MASTER_KEY}", "Content-Type": "application/json"}
 
     # === Логирование payload ===
-    try:
-        print(f"DEBUG: Payload to send to proxy for model {selected_model_id}:\n{json.dumps(payload_to_send, indent=2, ensure_ascii=False)}")
-    except Exception as e:
-        print(f"DEBUG: Ошибка при логировании payload: {e}")
+    if log_payload:
+        try:
+            print(f"DEBUG: Payload to send to proxy for model {selected_model_id}:\n{json.dumps(payload_to_send, indent=2, ensure_ascii=False)}")
+        except Exception as e:
+            print(f"DEBUG: Ошибка при логировании payload: {e}")
 
     try:
         response = requests.post(PROXY_WORKER_URL, headers=headers, json=payload_to_send, timeout=180)
@@ -275,6 +280,53 @@ def get_summary_from_llama(text_to_summarize: str, summary_length_ui: str, outpu
         return f"Неизвестная ошибка при взаимодействии с LLM: {e}"
 
 
+def _cut_smart_chunk(tokens: list[int], current_pos: int, target_chunk_tokens: int) -> tuple[str, list[int]]:
+    """
+    Вырезает один чанк из tokens начиная с current_pos, стараясь закончить его на границе абзаца/предложения.
+    Возвращает (текст чанка, токены чанка).
+    """
+    text_len = len(tokens)
+    # 1. Предлагаемая граница чанка
+    end_pos = min(current_pos + target_chunk_tokens, text_len)
+    chunk_text = ENCODING.decode(tokens[current_pos:end_pos])
+    # 2. Интеллектуальное обрезание по абзацу/предложению
+    smart_end = None
+    # Поиск границы абзаца (\n\n) в последней трети чанка
+    para_split_index = chunk_text.rfind("\n\n", int(len(chunk_text) * 0.5))
+    if para_split_index != -1 and para_split_index > int(len(chunk_text) * 0.3):
+        smart_end = para_split_index + 2
+    else:
+        # Поиск конца предложения в последней трети чанка
+        sent_split_chars = ['.', '!', '?']
+        best_sent_idx = -1
+        for i in range(len(chunk_text) - 1, int(len(chunk_text) * 0.3) - 1, -1):
+            if chunk_text[i] in sent_split_chars:
+                if i + 1 < len(chunk_text) and chunk_text[i+1].isspace():
+                    best_sent_idx = i + 1
+                    break
+                elif i + 1 == len(chunk_text):
+                    best_sent_idx = i + 1
+                    break
+        if best_sent_idx != -1:
+            smart_end = best_sent_idx
+    # 3. Если "умная" граница найдена и чанк не слишком короткий, используем её
+    if smart_end is not None:
+        smart_chunk = chunk_text[:smart_end]
+        smart_chunk_tokens = ENCODING.encode(smart_chunk)
+        # Если "умный" чанк слишком короткий (<50% target), пробуем добрать до target_chunk_tokens
+        if len(smart_chunk_tokens) < target_chunk_tokens * 0.5:
+            # Принудительно берем до target_chunk_tokens
+            smart_chunk = chunk_text
+            smart_chunk_tokens = ENCODING.encode(smart_chunk)
+        chunk_text = smart_chunk
+    # 4. Обрезаем чанк, если он вдруг получился больше target_chunk_tokens
+    chunk_tokens = ENCODING.encode(chunk_text)
+    if len(chunk_tokens) > target_chunk_tokens:
+        chunk_tokens = chunk_tokens[:target_chunk_tokens]
+        chunk_text = ENCODING.decode(chunk_tokens)
+    return chunk_text, chunk_tokens
+
+
 def text_splitter_intelligent(text: str, target_chunk_tokens: int, overlap_tokens: int) -> list[str]:
     MIN_PROGRESS_TOKENS = 100  # Минимальный гарантированный сдвиг по токенам
     if ENCODING is None:
@@ -291,44 +343,8 @@ def text_splitter_intelligent(text: str, target_chunk_tokens: int, overlap_token
     current_pos = 0
     text_len = len(tokens)
     while current_pos < text_len:
-        # 1. Предлагаемая граница чанка
-        end_pos = min(current_pos + target_chunk_tokens, text_len)
-        chunk_text = ENCODING.decode(tokens[current_pos:end_pos])
-        # 2. Интеллектуальное обрезание по абзацу/предложению
-        smart_end = None
-        # Поиск границы абзаца (\n\n) в последней трети чанка
-        para_split_index = chunk_text.rfind("\n\n", int(len(chunk_text) * 0.5))
-        if para_split_index != -1 and para_split_index > int(len(chunk_text) * 0.3):
-            smart_end = para_split_index + 2
-        else:
-            # Поиск конца предложения в последней трети чанка
-            sent_split_chars = ['.', '!', '?']
-            best_sent_idx = -1
-            for i in range(len(chunk_text) - 1, int(len(chunk_text) * 0.3) - 1, -1):
-                if chunk_text[i] in sent_split_chars:
-                    if i + 1 < len(chunk_text) and chunk_text[i+1].isspace():
-                        best_sent_idx = i + 1
-                        break
-                    elif i + 1 == len(chunk_text):
-                        best_sent_idx = i + 1
-                        break
-            if best_sent_idx != -1:
-                smart_end = best_sent_idx
-        # 3. Если "умная" граница найдена и чанк не слишком короткий, используем её
-        if smart_end is not None:
-            smart_chunk = chunk_text[:smart_end]
-            smart_chunk_tokens = ENCODING.encode(smart_chunk)
-            # Если "умный" чанк слишком короткий (<50% target), пробуем добрать до target_chunk_tokens
-            if len(smart_chunk_tokens) < target_chunk_tokens * 0.5:
-                # Принудительно берем до target_chunk_tokens
-                smart_chunk = chunk_text
-                smart_chunk_tokens = ENCODING.encode(smart_chunk)
-            chunk_text = smart_chunk
-        # 4. Обрезаем чанк, если он вдруг получился больше target_chunk_tokens
-        chunk_tokens = ENCODING.encode(chunk_text)
-        if len(chunk_tokens) > target_chunk_tokens:
-            chunk_tokens = chunk_tokens[:target_chunk_tokens]
-            chunk_text = ENCODING.decode(chunk_tokens)
+        # 1-4. Граница чанка с учетом абзацев/предложений
+        chunk_text, chunk_tokens = _cut_smart_chunk(tokens, current_pos, target_chunk_tokens)
         # 5. Добавляем чанк, если он не слишком короткий
         if count_tokens(chunk_text) > 20 and len(chunk_text.strip()) > 10:
             chunks.append(chunk_text)
@@ -343,76 +359,201 @@ def text_splitter_intelligent(text: str, target_chunk_tokens: int, overlap_token
     return chunks
 
 
-def summarize_text_map_reduce(text_to_summarize: str, summary_length_ui: str, output_format_ui: str, creativity_level: str, selected_model_id: Optional[str]) -> str:
-    total_tokens = count_tokens(text_to_summarize)
-    st.markdown(f"<small><i>Отладочная информация: Общее количество токенов: {total_tokens}</i></small>", unsafe_allow_html=True)
+def _split_at_last_whitespace(text: str) -> tuple[str, str]:
+    """
+    Делит текст перед последним пробельным промежутком: (голова, хвост).
+    Хвост (пробелы + недочитанное слово) переносится в следующий блок, чтобы слова и CRLF не рвались между блоками.
+    """
+    i = len(text)
+    while i > 0 and not text[i-1].isspace():
+        i -= 1
+    if i == 0:
+        # Пробелов нет совсем - режем посреди слова, чтобы перенос не рос бесконечно
+        return text, ""
+    while i > 0 and text[i-1].isspace():
+        i -= 1
+    if i == 0:
+        if text.isspace():
+            # Блок из одних пробелов целиком остается в переносе, чтобы \n{3,} схлопывалось со следующим блоком
+            return "", text
+        # Пробелы только в начале - голова пустая, иначе весь блок уйдет в перенос
+        return text, ""
+    return text[:i], text[i:]
+
+
+def _compact_whitespace_carry(carry: str, block_bytes: int) -> tuple[str, str]:
+    """
+    Сжимает перенос из одних пробелов, чтобы он не рос на длинных пробельных промежутках: (голова, хвост).
+    Голова отдается, только если сжатый перенос все еще длиннее блока (тысячи строк из одних пробелов); хвост
+    (последние переводы строк и пробелы, включая висящий \r от CRLF) остается в переносе и нормализуется
+    вместе со следующим блоком.
+    """
+    trailing_cr = "\r" if carry.endswith("\r") else ""
+    compact = _normalize_stream_block(carry[:len(carry) - len(trailing_cr)]) + trailing_cr
+    if len(compact) <= block_bytes:
+        return "", compact
+    head_len = re.search(r'[\r\n]*[ \t]*\Z', compact).start()
+    return compact[:head_len], compact[head_len:]
 
-    if total_tokens <= TOKEN_THRESHOLD:
-        st.markdown("<small><i>Отладочная информация: Текст короткий, используется прямое суммирование.</i></small>", unsafe_allow_html=True)
-        return get_summary_from_llama(text_to_summarize, summary_length_ui=summary_length_ui, output_format_ui=output_format_ui, creativity_level=creativity_level, selected_model_id=selected_model_id)
 
-    st.markdown(f"<small><i>Отладочная информация: Текст длинный ({total_tokens} токенов), используется MapReduce.</i></small>", unsafe_allow_html=True)
-    chunks = text_splitter_intelligent(text_to_summarize, CHUNK_TARGET_TOKENS, CHUNK_OVERLAP_TOKENS)
-    if not chunks:
-        return "Ошибка: Не удалось разбить текст на чанки для MapReduce."
-    st.markdown(f"<small><i>Отладочная информация: Текст разбит на {len(chunks)} чанков.</i></small>", unsafe_allow_html=True)
+def _normalize_stream_block(text: str) -> str:
+    """Нормализует пробелы в блоке так же, как clean_user_text (без разбора HTML)."""
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    text = re.sub(r'[ \t]+', ' ', text)
+    return re.sub(r'\n{3,}', '\n\n', text)
 
-    intermediate_summaries = []
-    progress_bar = st.progress(0)
-    for i, chunk in enumerate(chunks):
-        chunk_token_count = count_tokens(chunk)
-        status_text = st.empty()
-        status_text.markdown(f"<small><i>Суммаризация чанка {i+1}/{len(chunks)} ({chunk_token_count} токенов)...</i></small>", unsafe_allow_html=True)
 
-        # --- Логирование для отладки ---
-        with st.expander(f"Отладка Чанка {i+1}/{len(chunks)}", expanded=False):
+@contextmanager
+def open_document_buffer(uploaded_file):
+    """
+    Отдает содержимое загруженного файла (UploadedFile из st.file_uploader) как буфер байтов.
+    Streamlit уже держит загрузку в памяти целиком, поэтому берем view без копирования.
+    """
+    view = uploaded_file.getbuffer()
+    try:
+        yield view
+    finally:
+        view.release()
+
+
+def iter_document_text_blocks(buffer, block_bytes: int = UPLOAD_BLOCK_BYTES, on_progress: Optional[Callable[[float], None]] = None) -> Iterator[str]:
+    """
+    Потоково декодирует UTF-8 буфер (bytes, memoryview) блоками по block_bytes и нормализует пробелы.
+    Границы блоков проходят по пробелам, поэтому "".join(блоки) дает цельный очищенный текст.
+    Если файл не в UTF-8 (например, cp1251 или UTF-16), выбрасывается UnicodeDecodeError.
+    on_progress, если задан, получает долю прочитанных байт (0..1) после каждого блока.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="strict")
+    carry = ""
+    at_start = True
+    total_bytes = len(buffer)
+    for offset in range(0, total_bytes, block_bytes):
+        block, carry = _split_at_last_whitespace(carry + decoder.decode(bytes(buffer[offset:offset + block_bytes])))
+        if not block and len(carry) > block_bytes:
+            block, carry = _compact_whitespace_carry(carry, block_bytes)
+        if on_progress is not None:
+            on_progress(min(offset + block_bytes, total_bytes) / total_bytes)
+        block = _normalize_stream_block(block)
+        if at_start:
+            block = block.lstrip()
+        if block:
+            at_start = False
+            yield block
+    tail = _normalize_stream_block(carry + decoder.decode(b"", final=True)).rstrip()
+    if at_start:
+        tail = tail.lstrip()
+    if tail:
+        yield tail
+
+
+def stream_text_chunks(text_blocks: Iterable[str], target_chunk_tokens: int, overlap_tokens: int) -> Iterator[str]:
+    """
+    Потоковый аналог text_splitter_intelligent: токенизирует блоки по мере поступления и отдает чанки сразу.
+    В памяти держится только текущее окно токенов (блок + чанк), а не весь документ.
+    """
+    MIN_PROGRESS_TOKENS = 100  # Минимальный гарантированный сдвиг по токенам
+    if ENCODING is None:
+        step = max(MIN_PROGRESS_TOKENS, target_chunk_tokens - overlap_tokens if target_chunk_tokens > overlap_tokens else target_chunk_tokens)
+        words: list[str] = []
+        stream_finished = False
+        blocks = iter(text_blocks)
+        while not stream_finished:
+            block = next(blocks, None)
+            if block is None:
+                stream_finished = True
+            else:
+                words.extend(block.split())
+            while words and (stream_finished or len(words) >= target_chunk_tokens):
+                chunk = " ".join(words[:target_chunk_tokens])
+                if len(chunk.strip()) > 10 and len(chunk.split()) > 20:
+                    yield chunk
+                del words[:step]
+        return
+
+    tokens: list[int] = []
+    current_pos = 0
+    stream_finished = False
+    blocks = iter(text_blocks)
+    while not stream_finished:
+        block = next(blocks, None)
+        if block is None:
+            stream_finished = True
+        else:
+            tokens.extend(ENCODING.encode(block))
+        # Режем чанки, пока в окне набирается полный чанк (или поток закончился)
+        while current_pos < len(tokens) and (stream_finished or len(tokens) - current_pos >= target_chunk_tokens):
+            chunk_text, chunk_tokens = _cut_smart_chunk(tokens, current_pos, target_chunk_tokens)
+            if len(chunk_tokens) > 20 and len(chunk_text.strip()) > 10:
+                yield chunk_text
+            current_pos += max(MIN_PROGRESS_TOKENS, len(chunk_tokens) - overlap_tokens)
+        # Отбрасываем уже пройденные токены, чтобы окно не росло вместе с документом
+        consumed = min(current_pos, len(tokens))
+        del tokens[:consumed]
+        current_pos -= consumed
+
+
+def _map_chunk_summary(chunk: str, chunk_label: str, selected_model_id: Optional[str], show_debug_details: bool = True) -> Optional[str]:
+    """
+    Map-шаг для одного чанка. Возвращает промежуточное саммари или None, если чанк пропущен/не обработан.
+    show_debug_details=False отключает вывод текста чанка и payload и в UI, и в логи.
+    """
+    system_prompt = get_llm_system_prompt(
+        summary_length_key="Краткое саммари для этапа агрегации",
+        output_format_key="Простой текст (text)",
+        is_intermediate=True
+    )
+    user_prompt = f"Пожалуйста, суммаризируй следующий текст:\n\n{chunk}"
+    payload_to_send = {
+        "temperature": 0.2,
+        "model": selected_model_id,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+    }
+
+    # --- Логирование для отладки ---
+    if show_debug_details:
+        with st.expander(f"Отладка Чанка {chunk_label}", expanded=False):
             st.write("**Текст чанка:**")
             st.code(chunk)
-            system_prompt = get_llm_system_prompt(
-                summary_length_key="Краткое саммари для этапа агрегации",
-                output_format_key="Простой текст (text)",
-                is_intermediate=True
-            )
             st.write("**System Prompt:**")
             st.code(system_prompt)
-            user_prompt = f"Пожалуйста, суммаризируй следующий текст:\n\n{chunk}"
             st.write("**User Prompt:**")
             st.code(user_prompt)
-            payload_to_send = {
-                "temperature": 0.2,
-                "model": selected_model_id,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ]
-            }
             st.write("**Payload to send:**")
             st.code(payload_to_send)
 
-        print(f"[DEBUG] Chunk {i+1}/{len(chunks)}")
+    if show_debug_details:
+        print(f"[DEBUG] Chunk {chunk_label}")
         print("[DEBUG] System Prompt:\n", system_prompt)
         print("[DEBUG] User Prompt:\n", user_prompt)
         print("[DEBUG] Payload:", payload_to_send)
         print("[DEBUG] Chunk text:\n", chunk)
+    else:
+        # Без текста чанка, иначе в логи попадет весь документ
+        print(f"[DEBUG] Chunk {chunk_label} ({count_tokens(chunk)} tokens)")
+
+    intermediate_summary = get_summary_from_llama(
+        chunk,
+        summary_length_ui="Краткое саммари для этапа агрегации",
+        output_format_ui="Простой текст (text)",
+        creativity_level="Низкий",
+        selected_model_id=selected_model_id,
+        is_intermediate_summary=True,
+        log_payload=show_debug_details
+    )
+    # Пропуск мусорных чанков
+    if intermediate_summary.strip() == "НЕТ_ДАННЫХ_ДЛЯ_САММАРИ":
+        return None
+    if intermediate_summary.startswith("Ошибка:") or intermediate_summary.startswith("[ЗАГЛУШКА LLM] Ошибка"):
+        st.warning(f"Не удалось суммаризировать чанк {chunk_label}: {intermediate_summary}")
+        return None
+    return intermediate_summary
 
-        intermediate_summary = get_summary_from_llama(
-            chunk,
-            summary_length_ui="Краткое саммари для этапа агрегации",
-            output_format_ui="Простой текст (text)",
-            creativity_level="Низкий",
-            selected_model_id=selected_model_id,
-            is_intermediate_summary=True
-        )
-        # Пропуск мусорных чанков
-        if intermediate_summary.strip() == "НЕТ_ДАННЫХ_ДЛЯ_САММАРИ":
-            continue
-        if intermediate_summary.startswith("Ошибка:") or intermediate_summary.startswith("[ЗАГЛУШКА LLM] Ошибка"):
-            st.warning(f"Не удалось суммаризировать чанк {i+1}: {intermediate_summary}")
-        else:
-            intermediate_summaries.append(intermediate_summary)
-        progress_bar.progress((i + 1) / len(chunks))
-        status_text.empty()
 
+def _reduce_intermediate_summaries(intermediate_summaries: list[str], summary_length_ui: str, output_format_ui: str, creativity_level: str, selected_model_id: Optional[str]) -> str:
+    """Reduce-шаг: объединяет промежуточные саммари и строит финальное."""
     if not intermediate_summaries:
         return "Ошибка: Не удалось создать промежуточные саммари для агрегации."
 
@@ -443,6 +584,94 @@ def summarize_text_map_reduce(text_to_summarize: str, summary_length_ui: str, ou
     return final_summary
 
 
+def summarize_text_map_reduce(text_to_summarize: str, summary_length_ui: str, output_format_ui: str, creativity_level: str, selected_model_id: Optional[str]) -> str:
+    total_tokens = count_tokens(text_to_summarize)
+    st.markdown(f"<small><i>Отладочная информация: Общее количество токенов: {total_tokens}</i></small>", unsafe_allow_html=True)
+
+    if total_tokens <= TOKEN_THRESHOLD:
+        st.markdown("<small><i>Отладочная информация: Текст короткий, используется прямое суммирование.</i></small>", unsafe_allow_html=True)
+        return get_summary_from_llama(text_to_summarize, summary_length_ui=summary_length_ui, output_format_ui=output_format_ui, creativity_level=creativity_level, selected_model_id=selected_model_id)
+
+    st.markdown(f"<small><i>Отладочная информация: Текст длинный ({total_tokens} токенов), используется MapReduce.</i></small>", unsafe_allow_html=True)
+    chunks = text_splitter_intelligent(text_to_summarize, CHUNK_TARGET_TOKENS, CHUNK_OVERLAP_TOKENS)
+    if not chunks:
+        return "Ошибка: Не удалось разбить текст на чанки для MapReduce."
+    st.markdown(f"<small><i>Отладочная информация: Текст разбит на {len(chunks)} чанков.</i></small>", unsafe_allow_html=True)
+
+    intermediate_summaries = []
+    progress_bar = st.progress(0)
+    for i, chunk in enumerate(chunks):
+        chunk_token_count = count_tokens(chunk)
+        status_text = st.empty()
+        status_text.markdown(f"<small><i>Суммаризация чанка {i+1}/{len(chunks)} ({chunk_token_count} токенов)...</i></small>", unsafe_allow_html=True)
+        intermediate_summary = _map_chunk_summary(chunk, f"{i+1}/{len(chunks)}", selected_model_id)
+        if intermediate_summary is not None:
+            intermediate_summaries.append(intermediate_summary)
+        progress_bar.progress((i + 1) / len(chunks))
+        status_text.empty()
+
+    return _reduce_intermediate_summaries(intermediate_summaries, summary_length_ui, output_format_ui, creativity_level, selected_model_id)
+
+
+def summarize_text_stream_map_reduce(document_buffer, summary_length_ui: str, output_format_ui: str, creativity_level: str, selected_model_id: Optional[str]) -> str:
+    """
+    MapReduce для потокового источника (загруженный файл): чанки уходят в map-шаг по мере токенизации,
+    поэтому декодированный текст и токены в памяти ограничены одним блоком UPLOAD_BLOCK_BYTES плюс чанк
+    (сами байты загрузки держит Streamlit).
+    Прогресс считается по доле прочитанных байт документа.
+    """
+    bytes_read_fraction = 0.0
+
+    def track_progress(fraction: float) -> None:
+        nonlocal bytes_read_fraction
+        bytes_read_fraction = fraction
+
+    decode_error_message = "Ошибка: Файл не в кодировке UTF-8. Пересохраните документ в UTF-8 и загрузите его снова."
+    blocks = iter_document_text_blocks(document_buffer, on_progress=track_progress)
+    head_blocks = []
+    head_tokens = 0
+    stream_finished = True
+    try:
+        for block in blocks:
+            head_blocks.append(block)
+            head_tokens += count_tokens(block)
+            if head_tokens > TOKEN_THRESHOLD:
+                stream_finished = False
+                break
+    except UnicodeDecodeError:
+        return decode_error_message
+    if stream_finished:
+        # Документ целиком уместился в порог - обычный путь (прямое суммирование)
+        if not head_blocks:
+            return "Ошибка: Загруженный файл пуст или не содержит текста."
+        return summarize_text_map_reduce("".join(head_blocks), summary_length_ui, output_format_ui, creativity_level, selected_model_id)
+
+    st.markdown(f"<small><i>Отладочная информация: Документ длинный (>{TOKEN_THRESHOLD} токенов), используется потоковый MapReduce.</i></small>", unsafe_allow_html=True)
+    intermediate_summaries = []
+    chunk_count = 0
+    progress_bar = st.progress(0)
+    status_text = st.empty()
+    try:
+        for chunk_count, chunk in enumerate(stream_text_chunks(chain(head_blocks, blocks), CHUNK_TARGET_TOKENS, CHUNK_OVERLAP_TOKENS), start=1):
+            status_text.markdown(f"<small><i>Суммаризация чанка {chunk_count} ({count_tokens(chunk)} токенов)...</i></small>", unsafe_allow_html=True)
+            # Тексты чанков не выводятся в UI, иначе страница удержит в памяти весь документ
+            intermediate_summary = _map_chunk_summary(chunk, str(chunk_count), selected_model_id, show_debug_details=False)
+            if intermediate_summary is not None:
+                intermediate_summaries.append(intermediate_summary)
+            progress_bar.progress(bytes_read_fraction)
+    except UnicodeDecodeError:
+        # Некорректные байты могут встретиться и дальше по файлу, а не только в первом блоке
+        status_text.empty()
+        return decode_error_message
+    progress_bar.progress(1.0)
+    status_text.empty()
+
+    if chunk_count == 0:
+        return "Ошибка: Не удалось разбить текст на чанки для MapReduce."
+    st.markdown(f"<small><i>Отладочная информация: Документ обработан потоково, {chunk_count} чанков.</i></small>", unsafe_allow_html=True)
+    return _reduce_intermediate_summaries(intermediate_summaries, summary_length_ui, output_format_ui, creativity_level, selected_model_id)
+
+
 # --- Streamlit UI (main function) ---
 def main():
     st.set_page_config(page_title="Тестовое задание ML intern в Ifortex (2025 Edition)")
@@ -453,10 +682,11 @@ def main():
         # Theme switcher UI elements removed.
         # Other settings could be added here in the future.
 
-    tab1, tab2 = st.tabs(["Text Input", "URL Input"])
-    text_input_val, url_input_val = "", "" # Initialize
+    tab1, tab2, tab3 = st.tabs(["Text Input", "URL Input", "File Upload"])
+    text_input_val, url_input_val, uploaded_file_val = "", "", None # Initialize
     with tab1: text_input_val = st.text_area("Введите или вставьте текст для суммаризации сюда...", height=250, key="text_area_input", label_visibility="collapsed", placeholder="Введите или вставьте текст для суммаризации сюда...")
     with tab2: url_input_val = st.text_input("Вставьте ссылку на страницу (статья, отчет, Википедия и т.д.)...", key="url_input", label_visibility="collapsed", placeholder="Вставьте ссылку на страницу (статья, отчет, Википедия и т.д.)...")
+    with tab3: uploaded_file_val = st.file_uploader("Загрузите большой текстовый документ (.txt, .md)", type=["txt", "md"], key="file_upload_input")
 
     st.subheader("Опции Генерации")
     summary_length_val = st.radio("Длина Саммари:", ("Краткое саммари", "Развернутое саммари"), key="summary_length")
@@ -498,11 +728,14 @@ def main():
         st.session_state.summary_generated_once = True
         st.session_state.output_format_of_summary = output_format_val # Store format for rendering/download
         text_to_summarize_final = "" # Initialize
+        uploaded_file_to_stream = None # Set when the uploaded document is streamed instead of loaded as one string
 
         # Determine active tab/input source
         # This simple check prioritizes URL input if both have content.
         # A more robust tab detection might be needed if Streamlit offers better native support for it.
         if url_input_val: # User provided a URL
+            if uploaded_file_val is not None: # file_uploader keeps its file across reruns, so say which input wins
+                st.warning(f"Указаны и URL, и файл {uploaded_file_val.name}. Используется URL; очистите поле ссылки, чтобы суммаризировать файл.")
             with st.spinner(f"Извлечение текста из {url_input_val}..."):
                 fetched_content = fetch_text_from_url(url_input_val)
 
@@ -514,18 +747,24 @@ def main():
             st.markdown("<small><i>Контент извлечен из URL.</i></small>", unsafe_allow_html=True)
 
         elif text_input_val: # User provided text directly
+            if uploaded_file_val is not None: # file_uploader keeps its file across reruns, so say which input wins
+                st.warning(f"Указаны и текст, и файл {uploaded_file_val.name}. Используется введенный текст; очистите поле текста, чтобы суммаризировать файл.")
             with st.spinner("Очистка введенного текста..."):
                 cleaned_text = clean_user_text(text_input_val)
             text_to_summarize_final = cleaned_text
             st.markdown("<small><i>Введенный текст очищен.</i></small>", unsafe_allow_html=True)
+
+        elif uploaded_file_val is not None: # User uploaded a document - it is read and chunked as a stream later
+            uploaded_file_to_stream = uploaded_file_val
+            st.markdown(f"<small><i>Файл {uploaded_file_val.name} ({uploaded_file_val.size / (1024 * 1024):.1f} МБ) будет обработан потоково.</i></small>", unsafe_allow_html=True)
         else:
-            st.warning("Пожалуйста, введите текст или URL для суммаризации.")
+            st.warning("Пожалуйста, введите текст, URL или загрузите файл для суммаризации.")
             st.session_state.generated_summary = ""
             st.session_state.summary_generated_once = False # Reset if no input
             return
 
         # Post-processing check for empty content
-        if not text_to_summarize_final.strip():
+        if uploaded_file_to_stream is None and not text_to_summarize_final.strip():
             st.warning("Нет текста для суммаризации после очистки или извлечения. Пожалуйста, проверьте введенные данные.")
             st.session_state.generated_summary = ""
             return
@@ -568,13 +807,23 @@ def main():
             actual_model_id_to_use = DEFAULT_PLACEHOLDER_MODEL['modelId']
 
         # Call the summarization logic, now passing the selected model ID
-        st.session_state.generated_summary = summarize_text_map_reduce(
-            text_to_summarize_final,
-            summary_length_val,
-            output_format_val,
-            creativity_level_val,
-            actual_model_id_to_use # Pass the selected model ID
-        )
+        if uploaded_file_to_stream is not None:
+            with open_document_buffer(uploaded_file_to_stream) as document_buffer:
+                st.session_state.generated_summary = summarize_text_stream_map_reduce(
+                    document_buffer,
+                    summary_length_val,
+                    output_format_val,
+                    creativity_level_val,
+                    actual_model_id_to_use
+                )
+        else:
+            st.session_state.generated_summary = summarize_text_map_reduce(
+                text_to_summarize_final,
+                summary_length_val,
+                output_format_val,
+                creativity_level_val,
+                actual_model_id_to_use # Pass the selected model ID
+            )
         if st.session_state.generated_summary.startswith("Ошибка:"):
              st.error(st.session_state.generated_summary)
         elif st.session_state.generated_summary.startswith("[ЗАГЛУШКА LLM"): # Placeholder output
@@ -0,0 +1,82 @@
+import random
+
+import pytest
+
+import app
+from app import (
+    CHUNK_OVERLAP_TOKENS,
+    CHUNK_TARGET_TOKENS,
+    UPLOAD_BLOCK_BYTES,
+    clean_user_text,
+    iter_document_text_blocks,
+    stream_text_chunks,
+    text_splitter_intelligent,
+)
+
+
+class ByteEncoding:
+    """Побайтовая замена tiktoken: детерминированная и не требует загрузки словаря."""
+
+    def encode(self, text):
+        return list(text.encode("utf-8"))
+
+    def decode(self, tokens):
+        return bytes(tokens).decode("utf-8", errors="replace")
+
+
+def make_document(word_count):
+    rng = random.Random(26)
+    words = ["Привет", "мир.", "документ", "text", "summary!", "данные,", "chunk?", "ёжик"]
+    separators = [" ", " ", " ", "  ", "\t", "\n", "\n\n", "\n\n\n\n", " \n "]
+    return "".join(rng.choice(words) + rng.choice(separators) for _ in range(word_count))
+
+
+@pytest.mark.parametrize("encoding", [ByteEncoding(), None], ids=["tokens", "words"])
+@pytest.mark.parametrize("block_bytes", [64, 1000, 4096, UPLOAD_BLOCK_BYTES])
+def test_stream_chunks_match_in_memory_splitter(monkeypatch, encoding, block_bytes):
+    monkeypatch.setattr(app, "ENCODING", encoding)
+    text = make_document(8_000 if encoding is not None else 20_000)
+    expected = text_splitter_intelligent(clean_user_text(text), CHUNK_TARGET_TOKENS, CHUNK_OVERLAP_TOKENS)
+    blocks = iter_document_text_blocks(text.encode("utf-8"), block_bytes)
+    assert list(stream_text_chunks(blocks, CHUNK_TARGET_TOKENS, CHUNK_OVERLAP_TOKENS)) == expected
+    assert len(expected) > 1
+
+
+@pytest.mark.parametrize("data", [b"", b"  \r\n\t \n\n\n  ", "﻿".encode("utf-8")])
+def test_empty_or_whitespace_file_yields_nothing(data):
+    assert list(iter_document_text_blocks(data, 4)) == []
+
+
+@pytest.mark.parametrize("block_bytes", range(1, 8))
+def test_bom_and_multibyte_split_across_blocks(block_bytes):
+    data = "﻿Привет, ёжик 字".encode("utf-8")
+    assert "".join(iter_document_text_blocks(data, block_bytes)) == "Привет, ёжик 字"
+
+
+@pytest.mark.parametrize("block_bytes", range(1, 9))
+def test_crlf_split_across_blocks(block_bytes):
+    data = b"abc\r\ndef\r\n\r\n\r\nghi\r"
+    assert "".join(iter_document_text_blocks(data, block_bytes)) == "abc\ndef\n\nghi"
+
+
+def test_whitespace_run_longer_than_block_is_collapsed():
+    data = ("abc" + " " * 10 + "\n" * 5000 + "def").encode("utf-8")
+    assert "".join(iter_document_text_blocks(data, 1000)) == "abc \n\ndef"
+
+
+def test_carry_is_bounded_without_whitespace():
+    # Только ведущий пробел и длинный текст без пробелов (CJK, минифицированный контент)
+    data = b" word" + ("字" * 200_000).encode("utf-8")
+    block_bytes = 4096
+    blocks = list(iter_document_text_blocks(data, block_bytes))
+    assert "".join(blocks) == "word" + "字" * 200_000
+    assert max(len(block) for block in blocks) <= block_bytes + 16
+
+
+@pytest.mark.parametrize("data", [
+    ("Привет мир. " * 10).encode("cp1251"),
+    "Hello world. ".encode("utf-16"),
+])
+def test_non_utf8_file_is_rejected(data):
+    with pytest.raises(UnicodeDecodeError):
+        list(iter_document_text_blocks(data, 64))